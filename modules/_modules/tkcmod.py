@@ -5,8 +5,15 @@ Logic and operations are often tested in this module before being added
 to a live module.
 """
 
+import functools
 import logging
-from salt.exceptions import SaltInvocationError
+
+# This lets us python -m pydoc modules/_modules/tkcmod.py and not need
+# to worry about the salt dependency in the available python environment.
+try:
+    from salt.exceptions import SaltInvocationError
+except ImportError:
+    SaltInvocationError = Exception
 
 __virtualname__ = 'tkcmod'
 log = logging.getLogger(__name__)
@@ -16,25 +23,42 @@ def __virtual__():
     return __virtualname__
 
 
+@functools.lru_cache(maxsize=1)
+def _cached_config():
+    """
+    Return a cached config.get snapshot for this module.
+
+    config.get merges opts, grains, and pillar on every call; config
+    only changes on a saltutil.refresh_*, so take the snapshot once and
+    let clear_cache invalidate it.
+    """
+    return __salt__["config.get"](__virtualname__, {})
+
+
+def clear_cache():
+    """
+    Clear the cached config snapshot.
+
+    Run this after a saltutil.refresh_pillar or refresh_modules so the
+    next call picks up the new config.
+    """
+    _cached_config.cache_clear()
+    return True
+
+
 def test():
     """
     Testing config.get and outputing values in a runner module.
     """
-    config = __salt__["config.get"]("tkcmod", {})
-    return config
+    return _cached_config()
 
 
 def test_param(minion_id=None):
     """
     Testing config.get and outputing values in a runner module.
     """
-    if minion_id == None:
+    if minion_id is None:
         raise SaltInvocationError("minion_id parameter is required")
 
-
-    config = __salt__["config.get"]("tkcmod", {})
-    ret = {}
-    ret[minion_id] = config
-
-    return ret
+    return {minion_id: _cached_config()}
 
@@ -4,8 +4,13 @@ Salt runner module providing CI tools and utilities.
 Provides utility functions that CI workflows might find helpful which can be exposed from the salt-api runner client.
 """
 
+import concurrent.futures
+import copy
+import functools
+import hashlib
 import logging
-from pprint import pprint
+import os
+import sys
 
 # This lets us python -m pydoc modules/runners/citools.py and not need
 # to worry about the salt dependency in the available python environment.
@@ -13,11 +18,163 @@ try:
     import salt.config
     import salt.loader
     import salt.pillar
+    import salt.runner
+    import salt.state
 except ImportError:
     salt = None
 
 log = logging.getLogger(__name__)
 
+# Sentinel so dict.get can distinguish "key missing" from a None value.
+_MISS = object()
+
+# Diff markers. Interned so every emitted leaf shares one string object
+# instead of storing per-leaf copies.
+_ADDED = sys.intern("added")
+_MODIFIED = sys.intern("modified")
+_REMOVED = sys.intern("removed")
+
+
+@functools.lru_cache(maxsize=1)
+def _master_opts():
+    """
+    Load and cache the master config.
+
+    Parsing /etc/salt/master (and its includes) is pure disk and YAML
+    work that does not change between calls, so do it once per process.
+    Callers must copy the result before mutating it.
+    """
+    return salt.config.master_config("/etc/salt/master")
+
+
+# Rendered pillar keyed by (minion_id, pillarenv, roots fingerprint) so
+# repeated CI runs skip the compile when nothing on disk changed.
+_PILLAR_CACHE = {}
+
+
+def _roots_fingerprint(pillarenv):
+    """
+    Fingerprint the pillar roots configured for an environment.
+
+    Stats every file under the environment's pillar_roots (falling back
+    to base) and hashes the (path, mtime, size) tuples. Any change to
+    the rendered sources changes the fingerprint, which invalidates
+    cached pillar renders without a manual cache bust.
+
+    Args:
+        pillarenv (str): The pillar environment. (base, dev.<change_id>)
+
+    Returns:
+        str: A stable hex digest for the environment's on-disk state.
+    """
+    pillar_roots = _master_opts().get("pillar_roots", {})
+    roots = pillar_roots.get(pillarenv) or pillar_roots.get("base", [])
+
+    entries = []
+    for root in roots:
+        for dirpath, _dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_mtime_ns, stat.st_size))
+    entries.sort()
+
+    return hashlib.blake2b(repr(entries).encode()).hexdigest()
+
+
+@functools.lru_cache(maxsize=4)
+def _pillarenv_opts_and_grains(pillarenv):
+    """
+    Return an (opts, grains) pair for a pillar environment.
+
+    The grains load pulls in a large set of loader modules, so cache it
+    per environment rather than re-running it for every minion.
+    """
+    opts = copy.deepcopy(_master_opts())
+    opts["pillarenv"] = pillarenv
+    return opts, salt.loader.grains(opts)
+
+
+def _iter_leaf_paths(path, value):
+    """
+    Yield the path of every leaf at or below a value, iteratively.
+
+    A scalar yields its own path; a dict yields one path per nested
+    leaf. Used to label whole added or removed subtrees leaf by leaf so
+    the diff keeps their structure instead of flattening them to a
+    single marker.
+    """
+    stack = [(path, value)]
+    while stack:
+        path, value = stack.pop()
+        if type(value) is dict and value:
+            for key, sub_value in value.items():
+                stack.append((path + (key,), sub_value))
+        else:
+            yield path
+
+
+def _iter_pillar_changes(target_pillarenv, incoming_pillarenv):
+    """
+    Yield a (path, status) pair for every changed pillar leaf.
+
+    This is the flat form of the diff: path is a tuple of keys from the
+    tree root and status is one of the added/modified/removed markers.
+    Unchanged leaves are not yielded, so consumers that want a filtered
+    flat diff can use the pairs directly without re-walking a tree.
+
+    Args:
+        target_pillarenv (dict): A dict of the pillar rendered for the
+          target pillar environment / branch.
+        incoming_pillarenv (dict): A dict of the pillar rendered for the
+          incoming pillar environment / branch.
+
+    Yields:
+        tuple: (path, status) where path is a tuple of keys and status
+          is one of "added", "modified" or "removed".
+    """
+    if target_pillarenv is incoming_pillarenv:
+        return
+
+    # Bind hot globals to locals once; LOAD_FAST in the loop body is
+    # noticeably cheaper than LOAD_GLOBAL. Pillar data is plain dicts,
+    # so an exact type check beats isinstance's subclass handling.
+    _type = type
+    _dict = dict
+    # Explicit worklist instead of recursion so deep pillar trees do not
+    # pay a Python call frame per nesting level.
+    stack = [((), target_pillarenv, incoming_pillarenv)]
+
+    while stack:
+        path, target, incoming = stack.pop()
+
+        for key, target_value in target.items():
+            incoming_value = incoming.get(key, _MISS)
+            if incoming_value is _MISS:
+                for leaf_path in _iter_leaf_paths(path + (key,), target_value):
+                    yield leaf_path, _REMOVED
+                continue
+
+            # Shared or equal objects cannot contribute changes; skip
+            # the whole subtree before descending into it.
+            if target_value is incoming_value:
+                continue
+
+            if _type(target_value) is _dict and _type(incoming_value) is _dict:
+                if target_value != incoming_value:
+                    stack.append((path + (key,), target_value, incoming_value))
+                continue
+
+            if target_value != incoming_value:
+                yield path + (key,), _MODIFIED
+
+        for key in incoming.keys() - target.keys():
+            for leaf_path in _iter_leaf_paths(path + (key,), incoming[key]):
+                yield leaf_path, _ADDED
+
 
 def _determine_pillar_changes(target_pillarenv, incoming_pillarenv):
     """
@@ -124,151 +281,72 @@ def _determine_pillar_changes(target_pillarenv, incoming_pillarenv):
             }
 
     Returns:
-        dict: The differences between the two environments.
+        dict: The differences between the two environments. Unchanged
+          leaves are not reported and sub-dicts without any changes are
+          dropped entirely.
 
     Example:
         .. code-block:: python
-        {'ghar01.tkclabs.io': {'common': {'demo_key01': 'unchanged',
-                                        'demo_key02': {'demo_nestedkey01': 'unchanged',
-                                                        'demo_nestedkey02': 'modified',
-                                                        'demo_nestedkey03': 'added'},
-                                        'demo_key04': 'unchanged'},
-                            'ghar': {'demo_key01': 'unchanged',
-                                        'demo_key02': {'demo_nestedkey01': 'unchanged',
-                                                    'demo_nestedkey02': 'unchanged'},
-                                        'lookup': {'token': 'unchanged'}}},
-        'ghar02.tkclabs.io': {'common': {'demo_key01': 'unchanged',
-                                        'demo_key02': {'demo_nestedkey01': 'unchanged',
-                                                        'demo_nestedkey02': 'modified',
-                                                        'demo_nestedkey03': 'added'},
-                                        'demo_key04': 'unchanged'},
-                            'ghar': {'demo_key01': 'unchanged',
-                                        'demo_key02': {'demo_nestedkey01': 'unchanged',
-                                                    'demo_nestedkey02': 'unchanged'},
-                                        'lookup': {'token': 'unchanged'}}},
-        'ghar03.tkclabs.io': {'common': {'demo_key01': 'unchanged',
-                                        'demo_key02': {'demo_nestedkey01': 'unchanged',
-                                                        'demo_nestedkey02': 'unchanged'},
-                                        'demo_key04': 'unchanged'},
-                            'ghar': {'demo_key01': 'unchanged',
-                                        'demo_key02': {'demo_nestedkey01': 'unchanged',
-                                                    'demo_nestedkey02': 'unchanged'},
-                                        'lookup': {'token': 'unchanged'}}},
-        'salt01.tkclabs.io': {'common': {'demo_key01': 'unchanged',
-                                        'demo_key02': {'demo_nestedkey01': 'unchanged',
-                                                        'demo_nestedkey02': 'modified',
-                                                        'demo_nestedkey03': 'added'},
-                                        'demo_key04': 'unchanged'},
+        {'ghar01.tkclabs.io': {'common': {'demo_key02': {'demo_nestedkey02': 'modified',
+                                                         'demo_nestedkey03': 'added'}}},
+        'salt01.tkclabs.io': {'common': {'demo_key02': {'demo_nestedkey02': 'modified',
+                                                        'demo_nestedkey03': 'added'}},
                             'salt': {'demo_key01': 'added',
                                         'demo_key02': {'demo_nestedkey01': 'added',
                                                     'demo_nestedkey02': 'added'},
-                                        'lookup': {'master': 'modified',
-                                                'salt_api': {'certificate_contents': 'unchanged',
-                                                                'private_key_contents': 'unchanged'}}}}}
+                                        'lookup': {'master': 'modified'}}}}
 
     """
     changes = {}
 
-    for key in target_pillarenv.keys():
-        if key not in incoming_pillarenv:
-            changes[key] = "removed"
-            continue
-
-        if key in incoming_pillarenv:
-            if isinstance(target_pillarenv[key], dict) and isinstance(
-                incoming_pillarenv[key], dict
-            ):
-                changes[key] = {}
-                changes[key].update(
-                    _determine_pillar_changes(
-                        target_pillarenv[key], incoming_pillarenv[key]
-                    )
-                )
-                continue
-
-            if isinstance(target_pillarenv[key], dict) and not isinstance(
-                incoming_pillarenv[key], dict
-            ):
-                changes[key] = "modified"
-
-            if target_pillarenv[key] != incoming_pillarenv[key]:
-                changes[key] = "modified"
-            else:
-                # del changes[key]
-                changes[key] = "unchanged"
-
-    for key in incoming_pillarenv.keys():
-        if key not in target_pillarenv:
-            if isinstance(incoming_pillarenv[key], dict):
-                changes[key] = {}
-                for sub_key in incoming_pillarenv[key].keys():
-                    changes[key][sub_key] = "added"
-            else:
-                changes[key] = "added"
+    # Nest the flat (path, status) pairs back into a tree only here, at
+    # the API boundary; only changed paths are ever materialized, so no
+    # empty-subtree pruning pass is needed.
+    for path, status in _iter_pillar_changes(target_pillarenv, incoming_pillarenv):
+        node = changes
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = status
 
     return changes
 
 
-def _remove_unchanged_pillar(data):
-    """
-    Removes dict tree nodes that are marked as "unchanged".
-
-    This is a helper function to adjust the final output produced by the
-    validate_pillar_pr function.
-
-    Args:
-        data (dict): The dictionary to remove unchanged nodes from.
-
-    Returns:
-        dict: The dictionary with unchanged nodes removed.
-    """
-    if isinstance(data, dict):
-        keys_to_remove = []
-        for key, value in data.items():
-            if isinstance(value, dict):
-                _remove_unchanged_pillar(value)
-                if not value:  # if the dictionary is empty after removing unchanged
-                    keys_to_remove.append(key)
-            elif value == "unchanged":
-                keys_to_remove.append(key)
-        for key in keys_to_remove:
-            del data[key]
-    return data
-
-
 def update_local_git_content():
     """Attempt to get the latest Git content
 
     This function will attempt to update the fileserver and git_pillar
     content by running the fileserver.update and git_pillar.update
     """
-    opts = salt.config.master_config("/etc/salt/master")
+    # Shallow copy is enough: only top-level keys are set below and the
+    # cached template must stay pristine.
+    opts = dict(_master_opts())
+    opts["arg"] = []  # No arguments
 
-    # Run a fileserver.update
+    # One Runner for both calls; its loader scan and event bus setup are
+    # too expensive to pay twice. It reads opts["fun"] at run() time, so
+    # retargeting between runs is enough.
     opts["fun"] = "fileserver.update"
-    opts["arg"] = []  # No arguments
     runner = salt.runner.Runner(opts)
     runner.run()
 
-    # Run a git_pillar.update
     opts["fun"] = "git_pillar.update"
-    opts["arg"] = []  # No arguments
-    runner = salt.runner.Runner(opts)
     runner.run()
 
+    # New content invalidates every cached render
+    clear_caches()
 
-def get_lowstate_for_env(minion_id, saltenv):
-    """
-    Get the lowstate data for a minion in a specific environment.
 
-    Args:
-        minion_id (str): The minion ID. (hostname, fqdn, etc.)
-        saltenv (str): The environment. (base, dev.<change_id>)
+@functools.lru_cache(maxsize=512)
+def _compile_lowstate(minion_id, saltenv):
+    """
+    Compile and cache the lowstate ids for a minion in an environment.
 
-    Returns:
-        list: The lowstate ids for the minion_id and saltenv
+    The highstate compile behind this is seconds of render work, so keep
+    the result per (minion_id, saltenv) until clear_caches is called.
     """
-    opts = salt.config.master_config("/etc/salt/master")
+    # Shallow copy is enough: only top-level keys are set below and the
+    # cached template must stay pristine.
+    opts = dict(_master_opts())
 
     opts["saltenv"] = saltenv
     grains = salt.loader.grains(opts)
@@ -278,14 +356,51 @@ def get_lowstate_for_env(minion_id, saltenv):
     # Create a state object and gather the lowstate
     state = salt.state.HighState(opts)
     low_chunks = state.compile_low_chunks()
-    pprint(low_chunks)
+    # Guarded so production runs skip formatting the whole lowstate
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("low_chunks for %s in %s: %s", minion_id, saltenv, low_chunks)
 
     # Gather just the state_ids that are in the saltenv
-    state_ids_to_run = [
-        item["__id__"] for item in low_chunks if item.get("__env__", None) == saltenv
-    ]
+    # frozenset so callers can diff without re-hashing, and so the
+    # cached value is safely shareable. Built straight from a generator
+    # so no intermediate id list is materialized.
+    return frozenset(
+        item["__id__"] for item in low_chunks if item.get("__env__") == saltenv
+    )
+
+
+def get_lowstate_for_env(minion_id, saltenv):
+    """
+    Get the lowstate data for a minion in a specific environment.
+
+    Args:
+        minion_id (str): The minion ID. (hostname, fqdn, etc.)
+        saltenv (str): The environment. (base, dev.<change_id>)
+
+    Returns:
+        frozenset: The lowstate ids for the minion_id and saltenv
+    """
+    return _compile_lowstate(minion_id, saltenv)
+
+
+def clear_caches():
+    """
+    Clear all cached renders and config held by this runner.
+
+    Run this after the fileserver or git_pillar content changes so the
+    next validation renders fresh data; update_local_git_content does
+    this automatically.
+
+    CLI Example:
 
-    return state_ids_to_run
+    .. code-block:: bash
+     salt-run citools.clear_caches
+    """
+    _PILLAR_CACHE.clear()
+    _compile_lowstate.cache_clear()
+    _pillarenv_opts_and_grains.cache_clear()
+    _master_opts.cache_clear()
+    return True
 
 
 def get_pillar_for_env(minion_id, pillarenv):
@@ -304,12 +419,15 @@ def get_pillar_for_env(minion_id, pillarenv):
     Returns:
         dict: The rendered pillar data for the minion_id and pillarenv
     """
-    opts = salt.config.master_config("/etc/salt/master")
+    cache_key = (minion_id, pillarenv, _roots_fingerprint(pillarenv))
+    pillar_data = _PILLAR_CACHE.get(cache_key)
+    if pillar_data is not None:
+        return pillar_data
 
-    opts["pillarenv"] = pillarenv
-    grains = salt.loader.grains(opts)
+    opts, grains = _pillarenv_opts_and_grains(pillarenv)
     pillar = salt.pillar.Pillar(opts, grains, minion_id, pillarenv)
     pillar_data = pillar.compile_pillar()
+    _PILLAR_CACHE[cache_key] = pillar_data
 
     return pillar_data
 
@@ -333,18 +451,30 @@ def validate_pillar_pr(minion_ids, target_pillarenv, incoming_pillarenv):
      salt-run citools.validate_pillar_pr '[web01.local,srv01.local]' base dev.change_common_pillar
 
     """
-    target_pillar = {}
-    incoming_pillar = {}
-
-    for id in minion_ids:
-        target_pillar_content = get_pillar_for_env(id, target_pillarenv)
-        incoming_pillar_content = get_pillar_for_env(id, incoming_pillarenv)
+    changes = {}
 
-        target_pillar[id] = target_pillar_content
-        incoming_pillar[id] = incoming_pillar_content
+    # Compile in parallel but diff each minion as soon as its pair of
+    # renders is ready, holding only the filtered diff rather than two
+    # full pillar trees for the whole fleet.
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(32, max(1, len(minion_ids) * 2))
+    ) as executor:
+        jobs = [
+            (
+                minion_id,
+                executor.submit(get_pillar_for_env, minion_id, target_pillarenv),
+                executor.submit(get_pillar_for_env, minion_id, incoming_pillarenv),
+            )
+            for minion_id in minion_ids
+        ]
+
+        for minion_id, target_job, incoming_job in jobs:
+            minion_changes = _determine_pillar_changes(
+                target_job.result(), incoming_job.result()
+            )
+            if minion_changes:
+                changes[minion_id] = minion_changes
 
-    compared_pillar = _determine_pillar_changes(target_pillar, incoming_pillar)
-    changes = _remove_unchanged_pillar(compared_pillar)
     return changes
 
 
@@ -354,19 +484,32 @@ def validate_state_pr(minion_ids, target_saltenv, incoming_saltenv):
     """
     lowstate_changes = {}
 
-    for id in minion_ids:
-        target_lowstate_content = get_lowstate_for_env(id, target_saltenv)
-        incoming_lowstate_content = get_lowstate_for_env(id, incoming_saltenv)
-
-        state_ids_added = set(incoming_lowstate_content) - set(target_lowstate_content)
-        state_ids_removed = set(target_lowstate_content) - set(
-            incoming_lowstate_content
-        )
-
-        lowstate_changes[id] = {}
-        if len(state_ids_added) > 0:
-            lowstate_changes[id]["added"] = list(state_ids_added)
-        if len(state_ids_removed) > 0:
-            lowstate_changes[id]["removed"] = list(state_ids_removed)
+    # Lowstate compiles are as independent as the pillar renders in
+    # validate_pillar_pr, so overlap them the same way.
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(32, max(1, len(minion_ids) * 2))
+    ) as executor:
+        jobs = [
+            (
+                minion_id,
+                executor.submit(get_lowstate_for_env, minion_id, target_saltenv),
+                executor.submit(get_lowstate_for_env, minion_id, incoming_saltenv),
+            )
+            for minion_id in minion_ids
+        ]
+
+        for minion_id, target_job, incoming_job in jobs:
+            target_lowstate_content = target_job.result()
+            incoming_lowstate_content = incoming_job.result()
+
+            # Already frozensets; diff directly without re-hashing
+            state_ids_added = incoming_lowstate_content - target_lowstate_content
+            state_ids_removed = target_lowstate_content - incoming_lowstate_content
+
+            lowstate_changes[minion_id] = {}
+            if state_ids_added:
+                lowstate_changes[minion_id]["added"] = list(state_ids_added)
+            if state_ids_removed:
+                lowstate_changes[minion_id]["removed"] = list(state_ids_removed)
 
     return lowstate_changes
@@ -5,49 +5,91 @@ Logic and operations are often tested in this module before being added
 to a live module.
 """
 
+import functools
 import logging
 
-import salt.loader
-from salt.exceptions import SaltInvocationError
+# This lets us python -m pydoc modules/_runners/tkcrunner.py and not need
+# to worry about the salt dependency in the available python environment.
+try:
+    import salt.loader
+    from salt.exceptions import SaltInvocationError
+except ImportError:
+    salt = None
+    SaltInvocationError = Exception
 
 
+_CONFIG_KEY = "tkcrunner"
 log = logging.getLogger(__name__)
 
+# Loaded minion execution modules keyed by id(__opts__); see _mods().
+_MODS_CACHE = {}
+
+
+def _mods():
+    """
+    Return the minion execution modules for the current __opts__.
+
+    salt.loader.minion_mods scans and initializes every execution module
+    on each call, so cache the result per opts object and reuse it on
+    repeat runner invocations.
+    """
+    key = id(__opts__)
+    mods = _MODS_CACHE.get(key)
+    if mods is None:
+        mods = salt.loader.minion_mods(__opts__)
+        _MODS_CACHE[key] = mods
+    return mods
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_config():
+    """
+    Return a cached config.get snapshot for this module.
+
+    config.get merges opts, grains, and pillar on every call; config
+    only changes on a saltutil.refresh_*, so take the snapshot once and
+    let clear_cache invalidate it.
+    """
+    return __salt__["config.get"](_CONFIG_KEY, {})
+
+
+def clear_cache():
+    """
+    Clear the cached config snapshot.
+
+    Run this after a saltutil.refresh_pillar or refresh_modules so the
+    next call picks up the new config.
+    """
+    _cached_config.cache_clear()
+    return True
+
 
 def test():
     """
     Testing config.get and outputing values in a runner module.
     """
-    config = __salt__["config.get"]("tkcrunner", {})
-    return config
+    return _cached_config()
 
 
 def test_param(minion_id=None):
     """
     Testing config.get and outputing values in a runner module.
     """
-    if minion_id == None:
+    if minion_id is None:
         raise SaltInvocationError("minion_id parameter is required")
 
-
-    config = __salt__["config.get"]("tkcrunner", {})
-    ret = {}
-    ret[minion_id] = config
-
-    return ret
+    return {minion_id: _cached_config()}
 
 
 def tkcmod_test():
     """
     Load and use an execution module from a runner module.
     """
-    mods = salt.loader.minion_mods(__opts__)
-    return mods["tkcmod.test"]()
+    return _mods()["tkcmod.test"]()
 
 
 def tkcmod_test_param(minion_id):
     """
     Load and use an execution module from a runner module.
     """
-    mods = salt.loader.minion_mods(__opts__)
-    return mods["tkcmod.test_param"](minion_id)
+    return _mods()["tkcmod.test_param"](minion_id)
@@ -4,19 +4,29 @@ Salt runner module providing HashiCorp Vault tools and utilities.
 Provides utility functions for interacting with Vault from the salt controller.
 """
 
+import concurrent.futures
 import logging
 
 import hvac
 import salt.config
 import salt.loader
 import salt.pillar
+from salt.exceptions import CommandExecutionError
 
 log = logging.getLogger(__name__)
 
+# Vault clients keyed by their config so the authenticated session and
+# its connection pool are reused across calls.
+_CLIENT_CACHE = {}
+
 
 def _get_vault_client():
     """
     Return a Vault client object.
+
+    Constructing an hvac.Client sets up a fresh requests.Session, which
+    means a new TCP/TLS handshake on the next request, so clients are
+    cached per config and reused.
     """
 
     vault_defaults = {
@@ -26,8 +36,14 @@ def _get_vault_client():
     }
 
     config = __salt__['config.get']("vault", vault_defaults)
-    client = hvac.Client(**config)
-    
+
+    cache_key = tuple(sorted(config.items()))
+    client = _CLIENT_CACHE.get(cache_key)
+    if client is None:
+        client = hvac.Client(**config)
+        client.secrets.kv.default_kv_version = 2
+        _CLIENT_CACHE[cache_key] = client
+
     return client
 
 
@@ -46,10 +62,40 @@ def read_secret(path, key=None):
 
     vault = _get_vault_client()
 
-    if vault.is_authenticated():
-       vault.secrets.kv.default_kv_version = 2
-       response = vault.secrets.kv.read_secret(path=path, mount_point='kv')
+    if not vault.is_authenticated():
+        raise CommandExecutionError("Unable to authenticate to Vault")
 
-       # TODO: Add key handling and such next
+    response = vault.secrets.kv.read_secret(path=path, mount_point='kv')
+
+    # TODO: Add key handling and such next
 
     return response
+
+
+def read_secrets(paths):
+    """
+    Read multiple secrets from Vault concurrently.
+
+    The reads are independent HTTPS round trips, so they are issued in a
+    thread pool over one authenticated client instead of serializing
+    N round trips in a Python loop.
+
+    paths
+        A list of paths to secrets in Vault.
+
+    Returns a dict mapping each path to its secret response.
+    """
+
+    vault = _get_vault_client()
+
+    if not vault.is_authenticated():
+        raise CommandExecutionError("Unable to authenticate to Vault")
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(16, max(1, len(paths)))
+    ) as executor:
+        responses = executor.map(
+            lambda path: vault.secrets.kv.read_secret(path=path, mount_point='kv'),
+            paths,
+        )
+        return dict(zip(paths, responses))